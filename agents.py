@@ -1,26 +1,221 @@
 import os
-import json
-import requests
+import hashlib
+import asyncio
+import threading
+import httpx
+import orjson
+import diskcache
+from urllib.parse import urlparse
+from functools import lru_cache
 from typing import Dict, List, Any
-import google.generativeai as genai
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from weather_service import WeatherService
+
+# Load API keys from .env once per process
+load_dotenv()
+_SERPAPI_KEY = os.getenv('SERPAPI_KEY')
+_GENAI_API_KEY = os.getenv('GENAI_API_KEY')
+
+@lru_cache(maxsize=None)
+def _configure_genai():
+    """
+    Configure Gemini AI once per process.
+    """
+    import google.generativeai as genai
+    
+    genai.configure(api_key=_GENAI_API_KEY)
+
+# Prompt templates, built once at import time and filled in per request
+_ITINERARY_TMPL = """
+Create a comprehensive {duration}-day travel plan for {destination}
+
+Travel Context:
+- Source Location: {source_info}
+- Budget: ₹{budget}
+- Duration: {duration} days
+- Interests: {interests}
+- Accommodation: {accommodation}
+- Dietary Needs: {dietary}
+
+Weather Forecast:
+{weather}
+{context}
+Itinerary Requirements:
+1. Personalized day-by-day breakdown that accounts for the weather forecast
+2. Activities matching specific interests, prioritizing outdoor activities on good weather days
+3. Budget-conscious recommendations
+4. Detailed accommodation suggestions
+5. Dining options considering dietary needs
+6. Transportation logistics{journey}
+7. Cultural insights and local experiences
+8. Clothing recommendations based on weather
+9. Alternative indoor activities for days with poor weather
+
+Provide a structured response with:
+- Overall trip overview including weather summary
+{transport_details}- Detailed day-by-day itinerary with weather-appropriate activities
+- Packing list based on weather conditions
+- Budget breakdown in INR (₹)
+- Travel tips and local recommendations
+"""
+
+_CONTEXT_SECTION_TMPL = """
+{heading}:
+{items}
+"""
+
+# Seconds the travel-guide search may still take once weather, validation
+# and transport options are in; slower results are left out of the prompt
+_SECONDARY_CONTEXT_TIMEOUT = 1.5
 
 class WebSearchAgent:
+    # Process-wide TTL caches shared by every agent instance, keyed on
+    # normalized inputs so repeat lookups skip the network entirely
+    _cache_lock = threading.Lock()
+    _search_cache = TTLCache(maxsize=1024, ttl=3600)
+    # Forecasts go stale quickly: formatted summaries live no longer than the
+    # raw forecasts WeatherService keeps in Redis, and are not persisted
+    _weather_cache = TTLCache(maxsize=1024, ttl=15 * 60)
+    
     def __init__(self):
-        # Load API keys from environment
-        load_dotenv()
-        self.serpapi_key = os.getenv('SERPAPI_KEY')
-        self.genai_key = os.getenv('GENAI_API_KEY')
+        # Heavy imports are deferred until the first agent is built:
+        # google.generativeai alone pulls in gRPC and protobuf
+        import google.generativeai as genai
+        from weather_service import WeatherService
+        
+        # API keys are read once at import; configure Gemini AI
+        self.serpapi_key = _SERPAPI_KEY
+        self.genai_key = _GENAI_API_KEY
+        _configure_genai()
         
-        # Configure Gemini AI
-        genai.configure(api_key=self.genai_key)
         self.model = genai.GenerativeModel("gemini-1.5-flash")
         
         # Initialize weather service
         self.weather_service = WeatherService()
+        
+        # Persistent cache for search results and itineraries; survives restarts
+        # and is shared by every process using the same directory
+        self.cache = diskcache.Cache('.cache/travel')
+        
+        # Shared async HTTP client for all outbound search requests; HTTP/2
+        # multiplexes concurrent queries over one pooled TLS connection
+        self.client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+                retries=2
+            ),
+            timeout=httpx.Timeout(10.0, connect=3.0)
+        )
+        
+        # Cap in-flight Gemini and SerpAPI calls so concurrent requests
+        # interleave without exhausting the API rate limits
+        self._gemini_sem = asyncio.Semaphore(8)
+        self._serp_sem = asyncio.Semaphore(4)
+        
+        # Searches still running after their itinerary was built; referenced
+        # here so they are not garbage-collected before caching their results
+        self._background_tasks = set()
+    
+    async def aclose(self):
+        """
+        Close the shared HTTP clients and the disk cache.
+        """
+        # Let searches that missed an itinerary's deadline finish and cache their results
+        if self._background_tasks:
+            await asyncio.wait(self._background_tasks)
+        await self.client.aclose()
+        await self.weather_service.aclose()
+        self.cache.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+    
+    def _disk_key(self, kind: str, key) -> str:
+        """
+        Stable digest of a canonical cache key for the disk cache.
+        """
+        return hashlib.sha1(orjson.dumps([kind, key], option=orjson.OPT_SORT_KEYS)).hexdigest()
+    
+    def _cache_get(self, memory_cache: TTLCache, kind: str, key) -> Any:
+        """
+        Look up a key in the in-memory cache, falling back to the disk cache.
+        """
+        with self._cache_lock:
+            value = memory_cache.get(key)
+        if value is None:
+            value = self.cache.get(self._disk_key(kind, key))
+            if value is not None:
+                with self._cache_lock:
+                    memory_cache[key] = value
+        return value
     
-    def validate_location(self, location: str) -> bool:
+    def _cache_set(self, memory_cache: TTLCache, kind: str, key, value: Any, expire: int):
+        """
+        Store a value in both the in-memory and the disk cache.
+        """
+        with self._cache_lock:
+            memory_cache[key] = value
+        self.cache.set(self._disk_key(kind, key), value, expire=expire)
+    
+    def _itinerary_key(self, travel_request: Dict) -> str:
+        """
+        Canonical disk-cache key for an itinerary request.
+        Case and interest order map to the same key. The budget is kept exact
+        because the generated text quotes it and breaks it down in INR.
+        """
+        key = (
+            (travel_request.get('source') or '').lower().strip(),
+            travel_request['destination'].lower().strip(),
+            travel_request['duration'],
+            travel_request['budget'],
+            sorted(interest.lower().strip() for interest in travel_request['interests']),
+            travel_request['accommodation'],
+            (travel_request.get('dietary') or '').lower().strip()
+        )
+        return self._disk_key('itinerary', key)
+    
+    async def get_cached_itinerary(self, travel_request: Dict) -> Any:
+        """
+        Return a previously generated itinerary for an equivalent request, if any.
+        The weather forecast is not cached with it and is looked up fresh.
+        
+        Args:
+            travel_request: Travel request details
+            
+        Returns:
+            Cached itinerary result or None
+        """
+        itinerary = self.cache.get(self._itinerary_key(travel_request))
+        if itinerary is None:
+            return None
+        
+        weather_data = await self.get_weather_data(travel_request['destination'], travel_request['duration'])
+        return {**itinerary, 'weather_data': weather_data}
+    
+    def cache_itinerary(self, travel_request: Dict, result: Dict):
+        """
+        Store a generated itinerary for 24 hours.
+        Itineraries built without their full search context are not stored,
+        so the next equivalent request is generated with it.
+        
+        Args:
+            travel_request: Travel request details
+            result: Itinerary result with the generated text and its context
+        """
+        if not result.get('context_complete'):
+            return
+        
+        itinerary = {
+            key: result[key]
+            for key in ('ai_generated_itinerary', 'web_search_context', 'transport_options')
+        }
+        self.cache.set(self._itinerary_key(travel_request), itinerary, expire=86400)
+    
+    async def validate_location(self, location: str) -> bool:
         """
         Validate the location using the weather service.
         
@@ -30,19 +225,25 @@ class WebSearchAgent:
         Returns:
             True if valid, False otherwise
         """
+        # WeatherService already remembers confirmed and rejected locations
         try:
-            validation_result = self.weather_service.validate_location(location)
+            validation_result = await self.weather_service.validate_location(location)
             return validation_result.get("valid", False)
         except Exception:
             return False
 
-    def perform_web_search(self, query: str, num_results: int = 5) -> List[Dict]:
+    async def perform_web_search(self, query: str, num_results: int = 5) -> List[Dict]:
         """
         Perform web search using SerpAPI with comprehensive error handling.
         """
         if not self.serpapi_key:
             raise ValueError("SerpAPI key is required for web search")
         
+        cache_key = (query.lower().strip(), num_results)
+        cached = self._cache_get(self._search_cache, 'search', cache_key)
+        if cached is not None:
+            return cached
+        
         params = {
             'engine': 'google',
             'q': query,
@@ -51,27 +252,30 @@ class WebSearchAgent:
         }
         
         try:
-            response = requests.get('https://serpapi.com/search', params=params)
+            async with self._serp_sem:
+                response = await self.client.get('https://serpapi.com/search', params=params)
             response.raise_for_status()
-            results = response.json().get('organic_results', [])
+            results = orjson.loads(response.content).get('organic_results', [])
             
             # Extract key information from search results
             processed_results = [
                 {
                     'title': result.get('title', ''),
                     'link': result.get('link', ''),
-                    'snippet': result.get('snippet', ''),
+                    'snippet': (result.get('snippet') or '')[:200],
                     'source': result.get('source', '')
                 }
                 for result in results
             ]
             
+            if processed_results:
+                self._cache_set(self._search_cache, 'search', cache_key, processed_results, expire=86400)
             return processed_results
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"Web search error: {e}")
             return []
     
-    def get_weather_data(self, destination: str, duration: int) -> Dict:
+    async def get_weather_data(self, destination: str, duration: int) -> Dict:
         """
         Get weather forecast for the destination.
         
@@ -82,20 +286,29 @@ class WebSearchAgent:
         Returns:
             Formatted weather summary
         """
+        cache_key = (destination.lower().strip(), duration)
+        with self._cache_lock:
+            cached = self._weather_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             # Fetch raw weather data
-            forecast = self.weather_service.get_weather_forecast(destination, duration)
+            forecast = await self.weather_service.get_weather_forecast(destination, duration)
             
             # Check for errors
             if "error" in forecast:
                 return {"error": forecast.get("error", "Failed to fetch weather data")}
             
             # Format weather data into a user-friendly summary
-            return self.weather_service.format_weather_summary(forecast, duration)
+            summary = self.weather_service.format_weather_summary(forecast, duration)
+            with self._cache_lock:
+                self._weather_cache[cache_key] = summary
+            return summary
         except Exception as e:
             return {"error": f"Weather data retrieval failed: {str(e)}"}
     
-    def get_transport_options(self, source: str, destination: str) -> List[Dict]:
+    async def get_transport_options(self, source: str, destination: str) -> List[Dict]:
         """
         Get transportation options between source and destination.
         
@@ -109,104 +322,235 @@ class WebSearchAgent:
         try:
             # Search for transportation options
             search_query = f"How to travel from {source} to {destination} transportation options"
-            transport_results = self.perform_web_search(search_query, num_results=3)
+            transport_results = await self.perform_web_search(search_query, num_results=3)
             
             return transport_results
         except Exception as e:
             print(f"Transport search error: {e}")
             return []
     
-    def generate_comprehensive_itinerary(self, travel_request: Dict) -> Dict:
+    async def prepare_itinerary_context(self, travel_request: Dict) -> Dict:
         """
-        Generate a comprehensive travel itinerary using web search, weather data, and AI insights.
+        Gather weather, web search and transport context for the itinerary.
+        
+        The web and transport searches run alongside the weather lookup and
+        validation. Transport options are always awaited; the travel-guide
+        search gets a short deadline and is left out of the prompt if it misses
+        it, which is reported through context_complete.
+        
+        Args:
+            travel_request: Travel request details
+            
+        Returns:
+            Dictionary with the collected context and the itinerary prompt, or an error
         """
-        # Validate locations first
         source = travel_request.get('source', '')
         destination = travel_request['destination']
+        # Sort interests so the same set always produces the same (cacheable) query
+        search_query = f"Best travel guide for {travel_request['destination']} {' '.join(sorted(travel_request['interests']))}"
+        
+        # Secondary context only enriches the plan, so it runs in the background
+        web_task = asyncio.ensure_future(self.perform_web_search(search_query))
+        transport_task = asyncio.ensure_future(
+            self.get_transport_options(source, destination) if source else asyncio.sleep(0, result=[])
+        )
+        
+        # Fetch the weather forecast and validate the source concurrently
+        source_valid, weather_data = await asyncio.gather(
+            self.validate_location(source) if source else asyncio.sleep(0, result=True),
+            self.get_weather_data(destination, travel_request['duration'])
+        )
         
-        # Validate destination
-        if not self.validate_location(destination):
+        # A successful forecast already proves the destination exists; only
+        # fall back to an explicit validation when the weather lookup failed
+        if "error" in weather_data and not await self.validate_location(destination):
+            web_task.cancel()
+            transport_task.cancel()
             return {
                 'error': 'Invalid destination',
                 'details': f"'{destination}' does not appear to be a valid location"
             }
         
         # Validate source if provided
-        if source and not self.validate_location(source):
+        if not source_valid:
+            web_task.cancel()
+            transport_task.cancel()
             return {
                 'error': 'Invalid source location',
                 'details': f"'{source}' does not appear to be a valid location"
             }
         
-        # Perform web search for destination insights
-        search_query = f"Best travel guide for {travel_request['destination']} {' '.join(travel_request['interests'])}"
-        web_results = self.perform_web_search(search_query)
+        # Transport options are shown to the user, so they are always awaited
+        transport_options = await transport_task
+        
+        # The travel guide only enriches the prompt: past the deadline the
+        # itinerary is built without it while the search finishes in the background
+        await asyncio.wait({web_task}, timeout=_SECONDARY_CONTEXT_TIMEOUT)
+        context_complete = web_task.done()
+        if context_complete:
+            web_results = web_task.result()
+        else:
+            web_results = []
+            self._background_tasks.add(web_task)
+            web_task.add_done_callback(self._background_tasks.discard)
         
-        # Get transportation options if source is provided
-        transport_options = []
-        if source:
-            transport_options = self.get_transport_options(source, destination)
+        context = ""
+        if web_results:
+            context += _CONTEXT_SECTION_TMPL.format(
+                heading="Web Search Insights",
+                items=self._format_search_results(self._top_unique_results(web_results))
+            )
+        if transport_options:
+            context += _CONTEXT_SECTION_TMPL.format(
+                heading=f"Transportation Options from {source} to {destination}",
+                items=self._format_search_results(self._top_unique_results(transport_options))
+            )
         
-        # Get weather forecast for the destination
-        weather_data = self.get_weather_data(
-            travel_request['destination'], 
-            travel_request['duration']
+        # Prepare AI prompt with weather information and the search context
+        prompt = _ITINERARY_TMPL.format(
+            duration=travel_request['duration'],
+            destination=travel_request['destination'],
+            source_info=f"Starting from {source}" if source else "No specific starting location provided",
+            budget=travel_request['budget'],
+            interests=', '.join(travel_request['interests']),
+            accommodation=travel_request['accommodation'],
+            dietary=travel_request['dietary'],
+            weather=self._format_weather(weather_data),
+            context=context,
+            journey=f" including journey from {source} to {destination}" if source else "",
+            transport_details=f"- Transportation details from {source} to {destination}\n" if source else ""
         )
         
-        # Prepare AI prompt for itinerary generation with weather information
-        source_info = f"Starting from {source}" if source else "No specific starting location provided"
+        return {
+            'web_search_context': web_results,
+            'weather_data': weather_data,
+            'transport_options': transport_options,
+            'context_complete': context_complete,
+            'prompt': prompt
+        }
+    
+    def _format_search_results(self, results: List[Dict]) -> str:
+        """
+        Format search results as a compact bullet list for the prompt.
+        Links and sources are left out; they are only needed for display.
         
-        itinerary_prompt = f"""
-        Create a comprehensive {travel_request['duration']}-day travel plan for {travel_request['destination']}
-
-        Travel Context:
-        - Source Location: {source_info}
-        - Budget: ₹{travel_request['budget']}
-        - Duration: {travel_request['duration']} days
-        - Interests: {', '.join(travel_request['interests'])}
-        - Accommodation: {travel_request['accommodation']}
-        - Dietary Needs: {travel_request['dietary']}
-
-        Weather Forecast:
-        {json.dumps(weather_data, indent=2)}
-
-        Web Search Insights:
-        {json.dumps(web_results, indent=2)}
+        Args:
+            results: Processed search results
+            
+        Returns:
+            One "- title: snippet" line per result
+        """
+        return "\n".join(
+            f"- {result['title']}: {result['snippet']}"
+            for result in results
+        )
+    
+    def _top_unique_results(self, results: List[Dict], limit: int = 3) -> List[Dict]:
+        """
+        Keep the first result per domain, up to limit results, to bound prompt size.
         
-        {f"Transportation Options from {source} to {destination}:" if source else ""}
-        {json.dumps(transport_options, indent=2) if source else ""}
-
-        Itinerary Requirements:
-        1. Personalized day-by-day breakdown that accounts for the weather forecast
-        2. Activities matching specific interests, prioritizing outdoor activities on good weather days 
-        3. Budget-conscious recommendations
-        4. Detailed accommodation suggestions
-        5. Dining options considering dietary needs
-        6. Transportation logistics{f" including journey from {source} to {destination}" if source else ""}
-        7. Cultural insights and local experiences
-        8. Clothing recommendations based on weather
-        9. Alternative indoor activities for days with poor weather
-
-        Provide a structured response with:
-        - Overall trip overview including weather summary
-        {f"- Transportation details from {source} to {destination}" if source else ""}
-        - Detailed day-by-day itinerary with weather-appropriate activities
-        - Packing list based on weather conditions
-        - Budget breakdown in INR (₹)
-        - Travel tips and local recommendations
+        Args:
+            results: Processed search results
+            limit: Maximum number of results to keep
+            
+        Returns:
+            Deduplicated results
+        """
+        seen_domains = set()
+        unique_results = []
+        for result in results:
+            domain = urlparse(result['link']).netloc
+            if domain in seen_domains:
+                continue
+            seen_domains.add(domain)
+            unique_results.append(result)
+            if len(unique_results) == limit:
+                break
+        return unique_results
+    
+    def _format_weather(self, weather_data: Dict) -> str:
         """
+        Format the weather summary as one line per day for the prompt.
+        
+        Args:
+            weather_data: Weather summary from get_weather_data
+            
+        Returns:
+            Compact weather text
+        """
+        if "error" in weather_data:
+            return f"Not available ({weather_data['error']})"
+        
+        lines = [
+            f"{weather_data['location']}: {weather_data['conditions_summary']}, "
+            f"avg {weather_data['avg_min_temp_c']:.0f} to {weather_data['avg_max_temp_c']:.0f}°C"
+        ]
+        lines.extend(
+            f"Day {i} ({day['date']}): {day['condition']}, "
+            f"{day['min_temp_c']:.0f} to {day['max_temp_c']:.0f}°C"
+            + (f", outdoor score {day['outdoor_score']}/100" if 'outdoor_score' in day else "")
+            for i, day in enumerate(weather_data['daily_forecasts'], start=1)
+        )
+        return "\n".join(lines)
+    
+    async def _generate_text(self, prompt: str) -> str:
+        """
+        Generate a complete Gemini response for the prompt.
+        """
+        async with self._gemini_sem:
+            response = await self.model.generate_content_async(prompt)
+        return response.text
+    
+    async def stream_text(self, prompt: str):
+        """
+        Stream a Gemini response for the prompt as it is generated.
+        Close the generator when stopping early to end the Gemini stream.
+        
+        Args:
+            prompt: Prompt to send to Gemini
+            
+        Yields:
+            Chunks of response text
+        """
+        async with self._gemini_sem:
+            response = await self.model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                yield chunk.text
+    
+    def stream_itinerary(self, context: Dict):
+        """
+        Stream the AI-generated itinerary text as Gemini produces it.
+        
+        Args:
+            context: Context returned by prepare_itinerary_context
+            
+        Returns:
+            Async generator of itinerary text chunks
+        """
+        return self.stream_text(context['prompt'])
+    
+    async def generate_comprehensive_itinerary(self, travel_request: Dict, regenerate: bool = False) -> Dict:
+        """
+        Generate a comprehensive travel itinerary using web search, weather data, and AI insights.
+        Equivalent requests are served from the itinerary cache unless regenerate is set.
+        """
+        if not regenerate:
+            cached = await self.get_cached_itinerary(travel_request)
+            if cached is not None:
+                return cached
+        
+        context = await self.prepare_itinerary_context(travel_request)
+        if 'error' in context:
+            return context
         
         try:
             # Generate AI-powered itinerary
-            response = self.model.generate_content(itinerary_prompt)
+            itinerary = await self._generate_text(context.pop('prompt'))
             
             # Parse and structure the response
-            return {
-                'ai_generated_itinerary': response.text,
-                'web_search_context': web_results,
-                'weather_data': weather_data,
-                'transport_options': transport_options if source else []
-            }
+            result = {'ai_generated_itinerary': itinerary, **context}
+            self.cache_itinerary(travel_request, result)
+            return result
         
         except Exception as e:
             return {
@@ -217,6 +561,10 @@ class WebSearchAgent:
 def generate_itinerary(travel_request: Dict) -> Dict:
     """
     Main function to generate travel itinerary using WebSearchAgent.
+    Synchronous entry point for callers without a running event loop (e.g. Streamlit).
     """
-    agent = WebSearchAgent()
-    return agent.generate_comprehensive_itinerary(travel_request)
\ No newline at end of file
+    async def _generate() -> Dict:
+        async with WebSearchAgent() as agent:
+            return await agent.generate_comprehensive_itinerary(travel_request)
+    
+    return asyncio.run(_generate())
\ No newline at end of file
@@ -1,5 +1,6 @@
 import streamlit as st
-from agents import generate_itinerary
+import asyncio
+import threading
 import json
 from datetime import datetime, timedelta
 
@@ -44,6 +45,37 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Shared agent and event loop, created once per process and reused across reruns
+@st.cache_resource
+def get_agent():
+    from agents import WebSearchAgent
+    return WebSearchAgent()
+
+@st.cache_resource
+def get_event_loop():
+    # The cached agent's pooled HTTP connections are bound to the loop they
+    # were opened on, so every request runs on this one long-lived loop
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def submit(coro):
+    """
+    Schedule a coroutine on the shared background loop.
+    Returns a concurrent.futures.Future so concurrent sessions interleave on one loop.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+def iterate(async_gen):
+    """
+    Drive an async generator on the background loop, yielding its items synchronously.
+    """
+    while True:
+        try:
+            yield submit(async_gen.__anext__()).result()
+        except StopAsyncIteration:
+            return
+
 # Weather icon mapping function
 def get_weather_icon(condition):
     condition = condition.lower()
@@ -124,6 +156,8 @@ def main():
                 "Weather Activity Preference",
                 ["Balance indoor/outdoor activities", "Maximize outdoor activities", "Prefer indoor activities"]
             )
+            
+            regenerate = st.checkbox("Regenerate itinerary", help="Ignore any saved itinerary for the same trip")
         
         submitted = st.form_submit_button("Generate Itinerary")
     
@@ -146,7 +180,15 @@ def main():
                 }
                 
                 try:
-                    result = generate_itinerary(travel_request)
+                    agent = get_agent()
+                    
+                    # Reuse the itinerary of an equivalent earlier request when possible
+                    cached = None if regenerate else submit(agent.get_cached_itinerary(travel_request)).result()
+                    if cached is not None:
+                        result = cached
+                    else:
+                        future = submit(agent.prepare_itinerary_context(travel_request))
+                        result = future.result()
                     
                     # Check for errors
                     if 'error' in result:
@@ -212,9 +254,18 @@ def main():
                     elif 'weather_data' in result and 'error' in result['weather_data']:
                         st.warning(f"⚠️ Weather data not available: {result['weather_data']['error']}")
                     
-                    # AI Generated Itinerary
+                    # AI Generated Itinerary, rendered as Gemini streams it
                     st.subheader("🤖 AI Generated Itinerary")
-                    st.markdown(result.get('ai_generated_itinerary', 'No itinerary generated'), unsafe_allow_html=True)
+                    if cached is not None:
+                        st.markdown(result['ai_generated_itinerary'], unsafe_allow_html=True)
+                    else:
+                        text_stream = agent.stream_itinerary(result)
+                        try:
+                            result['ai_generated_itinerary'] = st.write_stream(iterate(text_stream))
+                        finally:
+                            # Stop the Gemini stream if the run is interrupted mid-way
+                            submit(text_stream.aclose()).result()
+                        agent.cache_itinerary(travel_request, result)
                     
                     # Web Search Context
                     with st.expander("🌐 Web Search Insights", expanded=False):
@@ -0,0 +1,16 @@
+# gunicorn_conf.py
+# Run with: gunicorn -c gunicorn_conf.py main:app
+import os
+
+# One async worker per core by default; override with WEB_CONCURRENCY
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Import the app once in the master so workers fork with modules already loaded.
+# Network clients are only created in the app's lifespan startup, i.e. per worker
+# after the fork, so no sockets are shared between processes.
+preload_app = True
+
+# Gemini calls can take a while to complete
+timeout = 120
@@ -1,18 +1,35 @@
-from fastapi import FastAPI, HTTPException, Request
+import asyncio
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, ValidationError
-from typing import List, Dict, Optional, Union, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from typing import List, Dict, Optional, Union, Any, Tuple, AsyncIterator
 from datetime import date
-from agents import generate_itinerary, WebSearchAgent
+from functools import lru_cache
+from contextlib import asynccontextmanager
+from agents import WebSearchAgent
 
-# Initialize FastAPI app with enhanced configuration
+# Shared agent, built once at startup and reused by every request so its
+# HTTP connection pools and caches stay warm. Under gunicorn this runs in each
+# worker after the fork, so workers never share httpx or Redis connections.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.agent = WebSearchAgent()
+    yield
+    # Release pooled connections when the server stops
+    await app.state.agent.aclose()
+
+# Initialize FastAPI app with enhanced configuration; endpoints declare a
+# response_model so FastAPI serializes straight to JSON bytes via Pydantic
 app = FastAPI(
     title="AI Travel Companion API",
     description="Advanced AI-powered travel itinerary generation platform with weather integration",
     version="1.3.0",
     docs_url="/documentation",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Add comprehensive CORS middleware
@@ -24,6 +41,16 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# Compress larger responses; itineraries with weather and web context are tens of KB
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+def get_agent(request: Request) -> WebSearchAgent:
+    return request.app.state.agent
+
+# Encode one record of a newline-delimited JSON (NDJSON) stream
+def ndjson_line(payload: Dict[str, Any]) -> bytes:
+    return orjson.dumps(payload) + b"\n"
+
 # Enhanced Request Models
 class TravelRequestModel(BaseModel):
     source: Optional[str] = Field(default=None, min_length=2, max_length=100, description="Starting location")
@@ -33,8 +60,8 @@ class TravelRequestModel(BaseModel):
     interests: List[str] = Field(
         default_factory=list, 
         description="List of traveler's interests",
-        min_items=1,
-        max_items=10
+        min_length=1,
+        max_length=10
     )
     accommodation: str = Field(
         default="Budget", 
@@ -54,6 +81,20 @@ class TravelRequestModel(BaseModel):
         default="Balance indoor/outdoor activities",
         description="Preference for weather-based activities"
     )
+    
+    @field_validator('interests', mode='before')
+    @classmethod
+    def normalize_interests(cls, interests: Any) -> Any:
+        # Strip and title-case interests; skip the copy when already canonical
+        if isinstance(interests, list) and not all(
+            isinstance(interest, str) and interest == interest.strip().title()
+            for interest in interests
+        ):
+            return [
+                interest.strip().title() if isinstance(interest, str) else interest
+                for interest in interests
+            ]
+        return interests
 
 class WeatherRequestModel(BaseModel):
     destination: str = Field(..., min_length=2, max_length=100, description="Location for weather forecast")
@@ -81,29 +122,29 @@ async def validation_exception_handler(request: Request, exc: ValidationError):
     )
 
 # Comprehensive Itinerary Generation Endpoint
+# Streams NDJSON: one line with the weather/web/transport context, then
+# {"delta": ...} lines as Gemini produces the itinerary text
 @app.post(
     "/generate_itinerary", 
     response_model=Dict[str, Any], 
     responses={
-        200: {"description": "Successful Itinerary Generation"},
+        200: {
+            "description": "Successful Itinerary Generation",
+            "content": {"application/x-ndjson": {}}
+        },
         400: {"model": ErrorResponse},
         422: {"model": ErrorResponse},
         500: {"model": ErrorResponse}
     }
 )
-async def create_itinerary(request: TravelRequestModel):
+async def create_itinerary(request: TravelRequestModel, search_agent: WebSearchAgent = Depends(get_agent)):
     try:
         # Convert Pydantic model to dictionary
-        travel_request = request.dict()
+        travel_request = request.model_dump(mode="python")
         
-        # Add some input preprocessing
-        travel_request['interests'] = [
-            interest.strip().capitalize() 
-            for interest in travel_request['interests']
-        ]
-        
-        # Generate comprehensive itinerary
-        itinerary = generate_itinerary(travel_request)
+        # Reuse the itinerary of an equivalent earlier request, otherwise gather its context
+        cached = await search_agent.get_cached_itinerary(travel_request)
+        itinerary = cached if cached is not None else await search_agent.prepare_itinerary_context(travel_request)
         
         # Check for errors in the response
         if 'error' in itinerary:
@@ -113,12 +154,11 @@ async def create_itinerary(request: TravelRequestModel):
                 "details": itinerary.get('details', {})
             }
         
-        # Enhanced response structure
+        # Enhanced response structure, sent ahead of the generated text
         response = {
             "status": "success",
             "destination": travel_request['destination'],
             "itinerary": {
-                "ai_generated": itinerary.get('ai_generated_itinerary', 'No detailed itinerary available'),
                 "web_context": itinerary.get('web_search_context', [])
             },
             "weather": itinerary.get('weather_data', {}),
@@ -134,8 +174,6 @@ async def create_itinerary(request: TravelRequestModel):
         if travel_request.get('source'):
             response["source"] = travel_request['source']
             response["transportation"] = itinerary.get('transport_options', [])
-        
-        return response
     
     except Exception as e:
         # Structured error response
@@ -147,6 +185,36 @@ async def create_itinerary(request: TravelRequestModel):
                 "details": str(e)
             }
         )
+    
+    async def stream() -> AsyncIterator[bytes]:
+        yield ndjson_line(response)
+        
+        if cached is not None:
+            yield ndjson_line({"delta": cached['ai_generated_itinerary']})
+            return
+        
+        # The status line is already sent, so failures are reported in-stream
+        chunks = []
+        text_stream = search_agent.stream_itinerary(itinerary)
+        try:
+            async for text in text_stream:
+                chunks.append(text)
+                yield ndjson_line({"delta": text})
+        except Exception as e:
+            yield ndjson_line({
+                "status": "error",
+                "message": "Itinerary generation failed",
+                "details": str(e)
+            })
+            return
+        finally:
+            # Stop the Gemini stream right away if the client disconnects
+            await text_stream.aclose()
+        
+        itinerary['ai_generated_itinerary'] = "".join(chunks)
+        search_agent.cache_itinerary(travel_request, itinerary)
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 # Weather Forecast Endpoint
 @app.post(
@@ -159,13 +227,10 @@ async def create_itinerary(request: TravelRequestModel):
         500: {"model": ErrorResponse}
     }
 )
-async def get_weather_forecast(request: WeatherRequestModel):
+async def get_weather_forecast(request: WeatherRequestModel, search_agent: WebSearchAgent = Depends(get_agent)):
     try:
-        # Initialize agent with weather service
-        search_agent = WebSearchAgent()
-        
         # Get weather forecast
-        weather_data = search_agent.get_weather_data(
+        weather_data = await search_agent.get_weather_data(
             request.destination,
             request.days
         )
@@ -193,17 +258,26 @@ async def get_weather_forecast(request: WeatherRequestModel):
             }
         )
 
+@lru_cache(maxsize=1024)
+def build_query(destination: str, interests: Tuple[str, ...] = ()) -> str:
+    """
+    Build the destination-insights search query.
+    """
+    return f"Best travel guide for {destination} " + \
+           (f"with {' '.join(interests)}" if interests else "")
+
 # Destination Search Endpoint
-@app.post("/destination_insights")
-async def destination_insights(destination: str, interests: Optional[List[str]] = None):
+@app.post("/destination_insights", response_model=Dict[str, Any])
+async def destination_insights(
+    destination: str,
+    interests: Optional[List[str]] = None,
+    search_agent: WebSearchAgent = Depends(get_agent)
+):
     try:
-        search_agent = WebSearchAgent()
-        
-        # Perform web search
-        search_query = f"Best travel guide for {destination} " + \
-                       (f"with {' '.join(interests)}" if interests else "")
+        # Perform web search; sorted interests give a canonical cache key
+        search_query = build_query(destination, tuple(sorted(interests or ())))
         
-        search_results = search_agent.perform_web_search(search_query)
+        search_results = await search_agent.perform_web_search(search_query)
         
         return {
             "status": "success",
@@ -232,31 +306,31 @@ async def destination_insights(destination: str, interests: Optional[List[str]]
         500: {"model": ErrorResponse}
     }
 )
-async def get_transportation_options(request: TransportRequestModel):
+async def get_transportation_options(request: TransportRequestModel, search_agent: WebSearchAgent = Depends(get_agent)):
     try:
-        # Initialize agent
-        search_agent = WebSearchAgent()
+        # Validate both locations concurrently
+        source_valid, destination_valid = await asyncio.gather(
+            search_agent.validate_location(request.source),
+            search_agent.validate_location(request.destination)
+        )
         
         # Validate locations
-        if not search_agent.validate_location(request.source):
+        if not source_valid:
             return {
                 "status": "error",
                 "message": "Invalid source location",
                 "details": f"'{request.source}' does not appear to be a valid location"
             }
             
-        if not search_agent.validate_location(request.destination):
+        if not destination_valid:
             return {
                 "status": "error",
                 "message": "Invalid destination location",
                 "details": f"'{request.destination}' does not appear to be a valid location"
             }
         
-        # Get transportation options
-        transport_options = search_agent.get_transport_options(
-            request.source,
-            request.destination
-        )
+        # Only spend SerpAPI quota once both locations are known to exist
+        transport_options = await search_agent.get_transport_options(request.source, request.destination)
         
         return {
             "status": "success",
@@ -276,11 +350,10 @@ async def get_transportation_options(request: TransportRequestModel):
         )
 
 # Location Validation Endpoint
-@app.post("/validate_location")
-async def validate_location(location: str):
+@app.post("/validate_location", response_model=Dict[str, Any])
+async def validate_location(location: str, search_agent: WebSearchAgent = Depends(get_agent)):
     try:
-        search_agent = WebSearchAgent()
-        validation_result = search_agent.validate_location(location)
+        validation_result = await search_agent.weather_service.validate_location(location)
         
         return {
             "status": "success",
@@ -300,7 +373,7 @@ async def validate_location(location: str):
         )
 
 # Health Check Endpoint
-@app.get("/health")
+@app.get("/health", response_model=Dict[str, Any])
 async def health_check():
     return {
         "status": "healthy",
@@ -316,31 +389,32 @@ async def health_check():
 
 # Optional: Comprehensive Travel Query Endpoint
 @app.post("/travel_query")
-async def process_travel_query(query: str):
+async def process_travel_query(query: str, search_agent: WebSearchAgent = Depends(get_agent)):
     """
     Process advanced travel-related queries.
     Future expansion point for more sophisticated query handling.
+    
+    The answer is streamed as NDJSON: a status line followed by
+    {"delta": ...} lines as Gemini produces the text.
     """
-    try:
-        search_agent = WebSearchAgent()
+    async def stream() -> AsyncIterator[bytes]:
+        yield ndjson_line({"status": "success", "query": query})
         
-        # Use Gemini to process the query
-        response = search_agent.model.generate_content(
+        # Use Gemini to process the query; failures are reported in-stream
+        text_stream = search_agent.stream_text(
             f"Provide a comprehensive response to the travel query: {query}"
         )
-        
-        return {
-            "status": "success",
-            "query": query,
-            "response": response.text
-        }
-    
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, 
-            detail={
+        try:
+            async for text in text_stream:
+                yield ndjson_line({"delta": text})
+        except Exception as e:
+            yield ndjson_line({
                 "status": "error",
                 "message": "Query processing failed",
                 "details": str(e)
-            }
-        )
\ No newline at end of file
+            })
+        finally:
+            # Stop the Gemini stream right away if the client disconnects
+            await text_stream.aclose()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
\ No newline at end of file
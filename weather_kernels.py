@@ -0,0 +1,67 @@
+# weather_kernels.py
+import numpy as np
+from functools import lru_cache
+from numba import njit
+
+# Condition codes, from best to worst outdoor weather
+CLEAR, CLOUDY, RAIN, SNOW, STORM = range(5)
+
+# Score penalty per condition code
+_CONDITION_PENALTIES = np.array([0.0, 10.0, 30.0, 35.0, 50.0])
+
+# Keywords checked in priority order when mapping a description to a code
+_CONDITION_KEYWORDS = (
+    (("storm", "thunder"), STORM),
+    (("snow", "sleet", "blizzard", "ice"), SNOW),
+    (("rain", "drizzle", "shower"), RAIN),
+    (("cloud", "overcast", "mist", "fog"), CLOUDY)
+)
+
+@lru_cache(maxsize=256)
+def condition_code(condition: str) -> int:
+    """
+    Map a textual weather condition to a small integer code.
+
+    Args:
+        condition: Weather condition description
+
+    Returns:
+        One of CLEAR, CLOUDY, RAIN, SNOW or STORM
+    """
+    condition = condition.lower()
+    for keywords, code in _CONDITION_KEYWORDS:
+        if any(keyword in condition for keyword in keywords):
+            return code
+    return CLEAR
+
+@njit(cache=True, fastmath=True)
+def score_days(max_temps, min_temps, precip_mm, cond_codes):
+    """
+    Score each forecast day from 0 (stay indoors) to 100 (ideal outdoor weather).
+
+    Args:
+        max_temps: Daily maximum temperatures in Celsius
+        min_temps: Daily minimum temperatures in Celsius
+        precip_mm: Daily total precipitation in millimetres
+        cond_codes: Daily condition codes from condition_code
+
+    Returns:
+        Integer array of daily outdoor scores
+    """
+    n = max_temps.shape[0]
+    scores = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        score = 100.0
+
+        # Comfortable between 15 and 27°C on average
+        avg_temp = (max_temps[i] + min_temps[i]) / 2.0
+        if avg_temp < 15.0:
+            score -= 2.0 * (15.0 - avg_temp)
+        elif avg_temp > 27.0:
+            score -= 2.0 * (avg_temp - 27.0)
+
+        score -= min(precip_mm[i] * 5.0, 50.0)
+        score -= _CONDITION_PENALTIES[cond_codes[i]]
+
+        scores[i] = max(0, min(100, int(round(score))))
+    return scores
@@ -1,21 +1,213 @@
 # weather_service.py
 import os
-import requests
+import re
+import sys
+import asyncio
+import httpx
+import orjson
+import numpy as np
+import redis.asyncio as redis
+from collections import Counter
+from cachetools import LRUCache
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 from dotenv import load_dotenv
+from weather_kernels import condition_code, score_days
+
+# Load API key from .env once per process
+load_dotenv()
+_WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
+_REDIS_URL = os.getenv('REDIS_URL')
+
+# Cache lifetimes: forecasts change within the hour, locations practically never
+_FORECAST_CACHE_TTL = 15 * 60
+_LOCATION_CACHE_TTL = 24 * 60 * 60
+
+# Redis bloom filter (RedisBloom) of location queries known to have no match
+_INVALID_LOCATIONS_FILTER = "invalid_locs"
+_INVALID_LOCATIONS_ERROR_RATE = 0.001
+_INVALID_LOCATIONS_CAPACITY = 100_000
+
+def _interned(*phrases: str) -> Tuple[str, ...]:
+    """
+    Intern recommendation phrases so every response shares the same string objects.
+    """
+    return tuple(sys.intern(phrase) for phrase in phrases)
+
+# Clothing by temperature, indexed by 5°C bucket: below 0, 0-10, 10-20, 20-25, 25+
+_CLOTHING_COLD = _interned(
+    "Heavy winter coat", "Thermal underlayers",
+    "Winter hat", "Gloves", "Scarf", "Insulated boots"
+)
+_CLOTHING_COOL = _interned(
+    "Winter coat", "Sweater/layers",
+    "Light gloves", "Warm hat"
+)
+_CLOTHING_MILD = _interned(
+    "Light jacket or coat", "Long sleeves",
+    "Light scarf", "Closed-toe shoes"
+)
+_CLOTHING_WARM = _interned(
+    "Light layers", "Long or short sleeves",
+    "Light pants or long shorts"
+)
+_CLOTHING_HOT = _interned(
+    "Light breathable clothing", "Short sleeves",
+    "Shorts or light pants", "Sun hat"
+)
+_CLOTHING_BY_TEMP = (
+    _CLOTHING_COLD,
+    _CLOTHING_COOL, _CLOTHING_COOL,
+    _CLOTHING_MILD, _CLOTHING_MILD,
+    _CLOTHING_WARM,
+    _CLOTHING_HOT
+)
+
+# Clothing additions by condition keyword, checked in priority order
+_CLOTHING_BY_CONDITION = (
+    (frozenset({"rain", "drizzle", "shower"}), _interned("Waterproof jacket", "Umbrella", "Waterproof shoes")),
+    (frozenset({"snow"}), _interned("Waterproof boots", "Snow-appropriate outerwear")),
+    (frozenset({"sun", "clear"}), _interned("Sunglasses", "Sunscreen", "Brimmed hat")),
+    (frozenset({"wind"}), _interned("Windbreaker"))
+)
+
+# Single pass over a condition description for every keyword of interest
+_COND_RE = re.compile(r"rain|drizzle|shower|snow|sun|clear|wind|storm")
+_BAD_WEATHER_KEYWORDS = frozenset({"rain", "storm"})
+
+_INDOOR_ACTIVITIES = _interned(
+    "Museum visits", "Indoor shopping", "Local food tour",
+    "Cooking classes", "Spa treatments", "Art galleries",
+    "Local theaters or performances", "Indoor markets"
+)
+_OUTDOOR_ACTIVITIES = _interned(
+    "Sightseeing tours", "Walking tours", "Outdoor dining",
+    "Parks and gardens", "Photography walks"
+)
+_OUTDOOR_ACTIVITIES_WARM = _OUTDOOR_ACTIVITIES + _interned(
+    "Beach activities", "Outdoor swimming",
+    "Boat tours", "Outdoor cafes"
+)
+_OUTDOOR_ACTIVITIES_MILD = _OUTDOOR_ACTIVITIES + _interned(
+    "Hiking", "Biking tours", "Outdoor markets",
+    "Wildlife watching", "Picnics"
+)
+_OUTDOOR_ACTIVITIES_COLD = _OUTDOOR_ACTIVITIES + _interned(
+    "Winter sports", "Scenic drives",
+    "Hot springs (if available)"
+)
 
 class WeatherService:
     def __init__(self):
-        # Load API key from environment
-        load_dotenv()
-        self.api_key = os.getenv('WEATHER_API_KEY')
+        self.api_key = _WEATHER_API_KEY
         self.base_url = "https://api.weatherapi.com/v1"
         
         if not self.api_key:
             raise ValueError("Weather API key is required")
+        
+        # Pooled async HTTP/2 client reused across all weather API calls
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=50),
+                retries=2
+            ),
+            timeout=5.0
+        )
+        
+        # Optional shared Redis cache for API responses (enabled via REDIS_URL)
+        self.redis = redis.Redis.from_url(
+            _REDIS_URL,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        ) if _REDIS_URL else None
+        
+        # Confirmed-valid location names, answered without any network call
+        self._valid_locations = LRUCache(maxsize=10_000)
+        
+        # Disabled once Redis turns out not to have the RedisBloom module
+        self._bloom_enabled = self.redis is not None
+        self._bloom_reserved = False
+        
+        # Forecast fetches currently in flight, keyed by (location, days)
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+    
+    async def aclose(self):
+        """
+        Close the HTTP client and the Redis connection pool.
+        """
+        await self._client.aclose()
+        if self.redis is not None:
+            await self.redis.aclose()
+    
+    async def _cache_get(self, key: str) -> Optional[Any]:
+        """
+        Read a cached API response from Redis.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Decoded response, or None on a miss or when Redis is unavailable
+        """
+        if self.redis is None:
+            return None
+        try:
+            cached = await self.redis.get(key)
+        except redis.RedisError:
+            return None
+        return orjson.loads(cached) if cached is not None else None
     
-    def get_basic_location_data(self, location: str) -> Dict:
+    async def _cache_set(self, key: str, value: Any, ttl: int):
+        """
+        Store an API response in Redis; caching is best-effort.
+        
+        Args:
+            key: Cache key
+            value: JSON-serializable response
+            ttl: Time to live in seconds
+        """
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(key, orjson.dumps(value), ex=ttl)
+        except redis.RedisError:
+            pass
+    
+    async def _bloom_command(self, *args) -> Optional[Any]:
+        """
+        Run a command against the invalid-locations bloom filter; best-effort.
+        
+        Args:
+            args: RedisBloom command and its arguments
+            
+        Returns:
+            Command result, or None when the filter is unavailable
+        """
+        if not self._bloom_enabled:
+            return None
+        try:
+            if not self._bloom_reserved:
+                try:
+                    await self.redis.execute_command(
+                        "BF.RESERVE", _INVALID_LOCATIONS_FILTER,
+                        _INVALID_LOCATIONS_ERROR_RATE, _INVALID_LOCATIONS_CAPACITY
+                    )
+                except redis.ResponseError as e:
+                    # Reserved earlier by this or another process
+                    if "exists" not in str(e).lower():
+                        raise
+                self._bloom_reserved = True
+            return await self.redis.execute_command(*args)
+        except redis.ResponseError:
+            # Unknown BF.* command: RedisBloom is not loaded on this server
+            self._bloom_enabled = False
+        except redis.RedisError:
+            pass
+        return None
+    
+    async def get_basic_location_data(self, location: str) -> Dict:
         """
         Get basic location data to validate if a location exists.
         
@@ -25,26 +217,36 @@ class WeatherService:
         Returns:
             Dictionary containing location data or error
         """
-        endpoint = f"{self.base_url}/search.json"
-        params = {
-            'key': self.api_key,
-            'q': location
-        }
+        name = location.lower().strip()
+        cache_key = f"loc:{name}"
+        results = await self._cache_get(cache_key)
         
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            results = response.json()
+        if results is None:
+            params = {
+                'key': self.api_key,
+                'q': location
+            }
             
-            # If the results array is empty, the location doesn't exist
-            if not results:
-                return {"error": f"Location '{location}' not found"}
+            try:
+                response = await self._client.get("/search.json", params=params)
+                response.raise_for_status()
+                results = orjson.loads(response.content)
+            except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+                return {"error": f"Location validation failed: {str(e)}"}
             
-            return {"location": results[0]}
-        except requests.RequestException as e:
-            return {"error": f"Location validation failed: {str(e)}"}
+            await self._cache_set(cache_key, results, _LOCATION_CACHE_TTL)
+            
+            # Remember unmatched queries so later validations skip the API
+            if not results:
+                await self._bloom_command("BF.ADD", _INVALID_LOCATIONS_FILTER, name)
+        
+        # If the results array is empty, the location doesn't exist
+        if not results:
+            return {"error": f"Location '{location}' not found"}
+        
+        return {"location": results[0]}
     
-    def validate_location(self, location: str) -> Dict:
+    async def validate_location(self, location: str) -> Dict:
         """
         Check if a location exists by attempting to get its coordinates.
         
@@ -54,15 +256,26 @@ class WeatherService:
         Returns:
             Dict with validation result
         """
+        name = location.lower().strip()
+        
+        # Reject obvious junk and answer known names without calling the API
+        if len(name) < 2:
+            return {"valid": False, "reason": f"Location '{location}' is too short"}
+        if self._valid_locations.get(name):
+            return {"valid": True}
+        if await self._bloom_command("BF.EXISTS", _INVALID_LOCATIONS_FILTER, name):
+            return {"valid": False, "reason": f"Location '{location}' not found"}
+        
         try:
-            result = self.get_basic_location_data(location)
+            result = await self.get_basic_location_data(location)
             if "error" in result:
                 return {"valid": False, "reason": result.get("error")}
+            self._valid_locations[name] = True
             return {"valid": True}
         except Exception as e:
             return {"valid": False, "reason": str(e)}
     
-    def get_weather_forecast(self, location: str, days: int = 10) -> Dict:
+    async def get_weather_forecast(self, location: str, days: int = 10) -> Dict:
         """
         Fetch weather forecast for a specific location for up to 10 days.
         
@@ -76,8 +289,34 @@ class WeatherService:
         # Ensure days is within valid range (1-10)
         days = min(max(days, 1), 10)
         
+        # Coalesce concurrent identical requests onto a single upstream fetch
+        key = (location.lower().strip(), days)
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._fetch_forecast(location, days))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        
+        # Shield so one cancelled caller does not cancel the fetch for the others
+        return await asyncio.shield(inflight)
+    
+    async def _fetch_forecast(self, location: str, days: int) -> Dict:
+        """
+        Fetch a forecast from the shared cache or the weather API.
+        
+        Args:
+            location: City or location name
+            days: Number of forecast days (already clamped to 1-10)
+        
+        Returns:
+            Dictionary containing weather forecast data
+        """
+        cache_key = f"wx:{location.lower().strip()}:{days}"
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
         # Build API request
-        endpoint = f"{self.base_url}/forecast.json"
         params = {
             'key': self.api_key,
             'q': location,
@@ -87,15 +326,18 @@ class WeatherService:
         }
         
         try:
-            response = requests.get(endpoint, params=params)
+            response = await self._client.get("/forecast.json", params=params)
             response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            forecast = orjson.loads(response.content)
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
             print(f"Weather forecast error: {e}")
             return {
                 'error': 'Failed to fetch weather data',
                 'details': str(e)
             }
+        
+        await self._cache_set(cache_key, forecast, _FORECAST_CACHE_TTL)
+        return forecast
     
     def get_clothing_recommendations(self, temp_c: float, condition: str) -> List[str]:
         """
@@ -108,47 +350,16 @@ class WeatherService:
         Returns:
             List of clothing recommendations
         """
-        recommendations = []
-        
-        # Temperature-based recommendations
-        if temp_c < 0:
-            recommendations.extend([
-                "Heavy winter coat", "Thermal underlayers", 
-                "Winter hat", "Gloves", "Scarf", "Insulated boots"
-            ])
-        elif temp_c < 10:
-            recommendations.extend([
-                "Winter coat", "Sweater/layers", 
-                "Light gloves", "Warm hat"
-            ])
-        elif temp_c < 20:
-            recommendations.extend([
-                "Light jacket or coat", "Long sleeves", 
-                "Light scarf", "Closed-toe shoes"
-            ])
-        elif temp_c < 25:
-            recommendations.extend([
-                "Light layers", "Long or short sleeves",
-                "Light pants or long shorts"
-            ])
-        else:
-            recommendations.extend([
-                "Light breathable clothing", "Short sleeves",
-                "Shorts or light pants", "Sun hat"
-            ])
-        
-        # Condition-based additions
-        condition = condition.lower()
-        if "rain" in condition or "drizzle" in condition or "shower" in condition:
-            recommendations.extend(["Waterproof jacket", "Umbrella", "Waterproof shoes"])
-        elif "snow" in condition:
-            recommendations.extend(["Waterproof boots", "Snow-appropriate outerwear"])
-        elif "sun" in condition or "clear" in condition:
-            recommendations.extend(["Sunglasses", "Sunscreen", "Brimmed hat"])
-        elif "wind" in condition:
-            recommendations.append("Windbreaker")
-        
-        return recommendations
+        # Temperature-based recommendations from the 5°C bucket table
+        bucket = min(max(int(temp_c // 5) + 1, 0), len(_CLOTHING_BY_TEMP) - 1)
+        
+        # Condition-based additions, first match in priority order
+        keywords = set(_COND_RE.findall(condition.lower()))
+        for condition_keywords, additions in _CLOTHING_BY_CONDITION:
+            if keywords & condition_keywords:
+                return list(_CLOTHING_BY_TEMP[bucket] + additions)
+        
+        return list(_CLOTHING_BY_TEMP[bucket])
     
     def get_activity_recommendations(self, forecast_day: Dict) -> Dict[str, List[str]]:
         """
@@ -161,45 +372,27 @@ class WeatherService:
             Dictionary with recommended and alternative activities
         """
         condition = forecast_day['day']['condition']['text'].lower()
-        max_temp = forecast_day['day']['maxtemp_c']
-        min_temp = forecast_day['day']['mintemp_c']
-        avg_temp = (max_temp + min_temp) / 2
+        avg_temp = (forecast_day['day']['maxtemp_c'] + forecast_day['day']['mintemp_c']) / 2
         precip_mm = forecast_day['day']['totalprecip_mm']
         
-        outdoor_activities = []
-        indoor_alternatives = [
-            "Museum visits", "Indoor shopping", "Local food tour",
-            "Cooking classes", "Spa treatments", "Art galleries",
-            "Local theaters or performances", "Indoor markets"
-        ]
-        
-        # Good weather activities
-        if precip_mm < 5 and "rain" not in condition and "storm" not in condition:
-            outdoor_activities.extend([
-                "Sightseeing tours", "Walking tours", "Outdoor dining",
-                "Parks and gardens", "Photography walks"
-            ])
-            
-            # Temperature-specific activities
-            if avg_temp > 20:
-                outdoor_activities.extend([
-                    "Beach activities", "Outdoor swimming", 
-                    "Boat tours", "Outdoor cafes"
-                ])
-            elif avg_temp > 10:
-                outdoor_activities.extend([
-                    "Hiking", "Biking tours", "Outdoor markets",
-                    "Wildlife watching", "Picnics"
-                ])
-            else:
-                outdoor_activities.extend([
-                    "Winter sports", "Scenic drives", 
-                    "Hot springs (if available)"
-                ])
+        # Poor weather: indoor activities only
+        if precip_mm >= 5 or _BAD_WEATHER_KEYWORDS & set(_COND_RE.findall(condition)):
+            return {
+                "recommended": list(_INDOOR_ACTIVITIES),
+                "alternatives": []
+            }
+        
+        # Good weather activities, with temperature-specific additions
+        if avg_temp > 20:
+            outdoor_activities = _OUTDOOR_ACTIVITIES_WARM
+        elif avg_temp > 10:
+            outdoor_activities = _OUTDOOR_ACTIVITIES_MILD
+        else:
+            outdoor_activities = _OUTDOOR_ACTIVITIES_COLD
         
         return {
-            "recommended": outdoor_activities if outdoor_activities else indoor_alternatives,
-            "alternatives": indoor_alternatives if outdoor_activities else []
+            "recommended": list(outdoor_activities),
+            "alternatives": list(_INDOOR_ACTIVITIES)
         }
     
     def format_weather_summary(self, forecast: Dict, duration: int) -> Dict:
@@ -221,7 +414,8 @@ class WeatherService:
         for i in range(actual_days):
             forecast_day = forecast['forecast']['forecastday'][i]
             date = forecast_day['date']
-            condition = forecast_day['day']['condition']['text']
+            # Interned so repeated conditions across days share one string
+            condition = sys.intern(forecast_day['day']['condition']['text'])
             max_temp = forecast_day['day']['maxtemp_c']
             min_temp = forecast_day['day']['mintemp_c']
             
@@ -243,15 +437,22 @@ class WeatherService:
             })
         
         # Overall trip weather summary
+        forecast_days = forecast['forecast']['forecastday'][:actual_days]
         conditions = [day['condition'] for day in daily_forecasts]
-        max_temps = [day['max_temp_c'] for day in daily_forecasts]
-        min_temps = [day['min_temp_c'] for day in daily_forecasts]
+        max_temps = np.fromiter((day['max_temp_c'] for day in daily_forecasts), dtype=np.float64, count=actual_days)
+        min_temps = np.fromiter((day['min_temp_c'] for day in daily_forecasts), dtype=np.float64, count=actual_days)
+        precip_mm = np.fromiter((day['day']['totalprecip_mm'] for day in forecast_days), dtype=np.float64, count=actual_days)
+        cond_codes = np.fromiter((condition_code(condition) for condition in conditions), dtype=np.int64, count=actual_days)
+        
+        # Score every day for outdoor activities in one compiled pass
+        for day, score in zip(daily_forecasts, score_days(max_temps, min_temps, precip_mm, cond_codes)):
+            day["outdoor_score"] = int(score)
         
         overall_summary = {
             "location": f"{forecast['location']['name']}, {forecast['location']['country']}",
             "forecast_days": actual_days,
-            "avg_max_temp_c": sum(max_temps) / len(max_temps),
-            "avg_min_temp_c": sum(min_temps) / len(min_temps),
+            "avg_max_temp_c": float(max_temps.mean()),
+            "avg_min_temp_c": float(min_temps.mean()),
             "conditions_summary": self._summarize_conditions(conditions),
             "daily_forecasts": daily_forecasts
         }
@@ -269,27 +470,20 @@ class WeatherService:
             String summarizing overall weather patterns
         """
         # Count occurrences of each condition
-        condition_counts = {}
-        for condition in conditions:
-            condition_counts[condition] = condition_counts.get(condition, 0) + 1
-        
-        # Sort by frequency
-        sorted_conditions = sorted(
-            condition_counts.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )
+        condition_counts = Counter(conditions)
         
         # Create summary based on frequency
         total_days = len(conditions)
         
-        if len(sorted_conditions) == 1:
-            return f"Consistently {sorted_conditions[0][0]} throughout your trip"
+        if len(condition_counts) == 1:
+            return f"Consistently {conditions[0]} throughout your trip"
         
-        main_condition, main_count = sorted_conditions[0]
+        # Only the leading conditions are needed unless one dominates the trip
+        top_conditions = condition_counts.most_common(3)
+        main_condition, main_count = top_conditions[0]
         if main_count / total_days >= 0.5:
-            other_conditions = ", ".join([cond for cond, _ in sorted_conditions[1:]])
+            other_conditions = ", ".join([cond for cond, _ in condition_counts.most_common()[1:]])
             return f"Mostly {main_condition} with some {other_conditions}"
         else:
-            condition_text = ", ".join([f"{cond}" for cond, _ in sorted_conditions[:3]])
+            condition_text = ", ".join([f"{cond}" for cond, _ in top_conditions])
             return f"Variable conditions including {condition_text}"
\ No newline at end of file